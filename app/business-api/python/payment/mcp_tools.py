@@ -1,16 +1,27 @@
 from fastmcp import FastMCP
 import logging
+import orjson
+import pydantic_core
 from typing import Optional, Annotated
 from services import PaymentService
 from models import Payment
+from payment_queue import PaymentQueue
 
 logger = logging.getLogger(__name__)
 payment_service = PaymentService()
-mcp = FastMCP("Payment MCP Server")
+payment_queue = PaymentQueue(payment_service)
 
 
-@mcp.tool(name="processPayment", description="Submit a payment request")
-def process_payment(
+def orjson_serializer(data) -> str:
+    # orjson instead of FastMCP default encoder for tool results, pydantic models are dumped through pydantic_core
+    return orjson.dumps(data, default=pydantic_core.to_jsonable_python).decode()
+
+
+mcp = FastMCP("Payment MCP Server", tool_serializer=orjson_serializer)
+
+
+@mcp.tool(name="processPayment", description="Submit a payment request. The payment is accepted immediately and processed in background: use paymentStatus with the returned intent_id to check its outcome")
+async def process_payment(
     account_id: Annotated[str, "Unique identifier for the account making the payment"],
     amount: Annotated[float, "Payment amount in the account's currency"],
     description: Annotated[str, "Description or purpose of the payment"],
@@ -23,8 +34,9 @@ def process_payment(
     logger.info("processPayment called with account_id=%s, amount=%s, description=%s", 
                 account_id, amount, description)
     
-    # Create Payment object from individual parameters
-    payment_obj = Payment(
+    # Create Payment object from individual parameters. FastMCP has already validated them against the
+    # tool signature, which matches the Payment fields, so the model validation is skipped
+    payment_obj = Payment.model_construct(
         accountId=account_id,
         amount=amount,
         description=description,
@@ -35,5 +47,16 @@ def process_payment(
         timestamp=timestamp
     )
 
-    payment_service.process_payment(payment_obj)
-    return {"status": "ok"}
+    # invalid payments are still rejected synchronously, only the settlement is queued
+    payment_service.validate_payment(payment_obj)
+    intent_id = payment_queue.submit(payment_obj)
+    return {"status": "accepted", "intent_id": intent_id}
+
+
+@mcp.tool(name="paymentStatus", description="Get the processing status of a payment submitted with processPayment")
+def payment_status(intent_id: Annotated[str, "Payment intent id returned by processPayment"]):
+    logger.info("paymentStatus called with intent_id=%s", intent_id)
+    intent = payment_queue.get_status(intent_id)
+    if intent is None:
+        raise ValueError(f"Payment intent {intent_id} not found")
+    return intent
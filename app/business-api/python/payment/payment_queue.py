@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from models import Payment
+from services import PaymentService
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentQueue:
+    """Accepts payments right away and settles them in background with PaymentService.
+
+    Each submitted payment gets an intent id whose status moves from "accepted" to
+    "processing" and then "completed" or "failed".
+    """
+
+    def __init__(self, payment_service: PaymentService, max_tracked_intents: int = 10_000):
+        self.payment_service = payment_service
+        self.max_tracked_intents = max_tracked_intents
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._intents: OrderedDict[str, dict] = OrderedDict()
+
+    def submit(self, payment: Payment) -> str:
+        self._ensure_worker()
+        intent_id = str(uuid.uuid4())
+        self._set_status(intent_id, "accepted")
+        self._queue.put_nowait((intent_id, payment))
+        return intent_id
+
+    def get_status(self, intent_id: str) -> Optional[dict]:
+        return self._intents.get(intent_id)
+
+    def _ensure_worker(self):
+        # the queue and its worker are bound to the event loop of the MCP server, so they are created on first use
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            intent_id, payment = await self._queue.get()
+            self._set_status(intent_id, "processing")
+            try:
+                # PaymentService is blocking, keep it off the event loop serving the MCP requests
+                await asyncio.to_thread(self.payment_service.process_payment, payment)
+                self._set_status(intent_id, "completed")
+            except Exception as ex:
+                logger.exception("Payment intent [%s] failed: %s", intent_id, ex)
+                self._set_status(intent_id, "failed", str(ex))
+            finally:
+                self._queue.task_done()
+
+    def _set_status(self, intent_id: str, status: str, error: Optional[str] = None):
+        intent = {"intent_id": intent_id, "status": status}
+        if error is not None:
+            intent["error"] = error
+        self._intents[intent_id] = intent
+        self._intents.move_to_end(intent_id)
+        # only the most recent intents are tracked
+        while len(self._intents) > self.max_tracked_intents:
+            self._intents.popitem(last=False)
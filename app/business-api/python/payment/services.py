@@ -23,7 +23,7 @@ class PaymentService:
                 "TRANSACTIONS_API_SERVER_URL is not configured. Provide `transaction_api_url` to PaymentService or set the TRANSACTIONS_API_URL environment variable."
             )
 
-    def process_payment(self, payment: Payment):
+    def validate_payment(self, payment: Payment):
         # validations similar to Java implementation
         if not payment.accountId:
             raise ValueError("AccountId is empty or null")
@@ -36,6 +36,9 @@ class PaymentService:
         if payment.paymentMethodId and not payment.paymentMethodId.isdigit():
             raise ValueError("paymentMethodId is not a valid number")
 
+    def process_payment(self, payment: Payment):
+        self.validate_payment(payment)
+
         # Pydantic v2: `json()` is deprecated. Use `model_dump_json()` instead.
         logger.info("Payment successful for: %s", payment.model_dump_json())
 
@@ -45,12 +48,14 @@ class PaymentService:
 
         try:
             url = f"{self.transaction_api_url}/api/transactions/{payment.accountId}"
-            # prefer sending native dict for requests body, use model_dump for Pydantic v2
-            resp = requests.post(url, json=transaction.model_dump())
+            # send the pydantic encoded JSON body directly, avoiding the model_dump dict and the stdlib json encoding
+            resp = requests.post(url, data=transaction.model_dump_json(), headers={"Content-Type": "application/json"})
             resp.raise_for_status()
             logger.info("Transaction notified for: %s", transaction.model_dump_json())
         except Exception as ex:
-            logger.exception("Failed to notify transaction: %s", ex)
+            logger.error("Failed to notify transaction: %s", ex)
+            # surfaced to the payment queue, so that the payment intent is reported as failed
+            raise
 
     def _convert_payment_to_transaction(self, payment: Payment) -> Transaction:
         return Transaction(
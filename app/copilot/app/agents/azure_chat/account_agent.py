@@ -1,6 +1,8 @@
 from agent_framework.azure import AzureOpenAIChatClient
-from agent_framework import ChatAgent, MCPStreamableHTTPTool
+from agent_framework import ChatAgent
+from app.helpers.mcp_pool import MCPPool, MCPSessions
 
+import asyncio
 import logging
 
 
@@ -16,29 +18,39 @@ class AccountAgent :
     name = "AccountAgent"
     description = "This agent manages user accounts related information such as balance, credit cards."
 
-    def __init__(self, azure_chat_client: AzureOpenAIChatClient, account_mcp_server_url: str):
+    def __init__(self, azure_chat_client: AzureOpenAIChatClient, account_mcp_pool: MCPPool):
         self.azure_chat_client = azure_chat_client
-        self.account_mcp_server_url = account_mcp_server_url
+        self.account_mcp_pool = account_mcp_pool
+        self._af_agent: ChatAgent | None = None
+        self._af_agent_lock = asyncio.Lock()
+        self._mcp_sessions = MCPSessions(account_mcp_pool)
 
 
 
     async def build_af_agent(self)-> ChatAgent:
+      """Return the Account agent, building it on first use.
+      The agent doesn't depend on the request, so it is shared by all the conversations.
+      While an MCP server is unavailable the agent is built without its tools, and built again on the next call until it's back.
+      """
+      if self._af_agent is None or not self._mcp_sessions.complete:
+        async with self._af_agent_lock:
+          if self._af_agent is None or not self._mcp_sessions.complete:
+            self._af_agent = await self._create_af_agent()
+      return self._af_agent
+
+    async def _create_af_agent(self)-> ChatAgent:
     
       logger.info("Initializing Account Agent connection for account api ")
       
       user_mail="bob.user@contoso.com"
-      full_instruction = AccountAgent.instructions.format(user_mail=user_mail)
-
-      account_mcp_server = MCPStreamableHTTPTool(
-            name="Account MCP server client",
-            url=self.account_mcp_server_url)
       logger.info("Initializing Account MCP server tools ")
+      mcp_servers = await self._mcp_sessions.acquire_missing()
+      full_instruction = AccountAgent.instructions.format(user_mail=user_mail) + self._mcp_sessions.unavailable_instructions()
 
-      await account_mcp_server.connect()
       return ChatAgent(
             chat_client=self.azure_chat_client,
             instructions=full_instruction,
             name=AccountAgent.name,
-            tools=[account_mcp_server]
+            tools=mcp_servers
         )
     
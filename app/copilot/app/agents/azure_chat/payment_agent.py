@@ -1,8 +1,10 @@
 from agent_framework.azure import AzureOpenAIChatClient
-from agent_framework import ChatAgent, MCPStreamableHTTPTool
+from agent_framework import ChatAgent
 from app.helpers.document_intelligence_scanner import DocumentIntelligenceInvoiceScanHelper
+from app.helpers.current_timestamp_provider import CurrentTimestampProvider
+from app.helpers.mcp_pool import MCPPool, MCPSessions
 
-from datetime import datetime
+import asyncio
 
 import logging
 
@@ -22,12 +24,11 @@ class PaymentAgent :
         Before submitting the payment to the system ask the user confirmation providing the payment details.
         Include in the payment description the invoice id or bill id as following: payment for invoice 1527248.
         When submitting payment always use the available functions to retrieve accountId, paymentMethodId.
-        If the payment succeeds provide the user with the payment confirmation. If not provide the user with the error message.
+        Payments are processed asynchronously: when the payment request is accepted tell the user the payment has been submitted, not that it succeeded.
+        Use the payment status function with the returned intent id to check the outcome. If the payment is completed provide the user with the payment confirmation. If it failed or the payment request is rejected provide the user with the error message.
         Use HTML list or table to display bill extracted data, payments, account or transaction details.
         Always use the below logged user details to retrieve account info:
        {user_mail}
-        Current timestamp:
-       {current_date_time}
         Don't try to guess accountId,paymentMethodId from the conversation.When submitting payment always use functions to retrieve accountId, paymentMethodId.
         
         ### Output format
@@ -66,55 +67,45 @@ class PaymentAgent :
     description = "This agent manages user payments related information such as submitting payment requests and bill payments."
 
     def __init__(self, azure_chat_client: AzureOpenAIChatClient,
-                  account_mcp_server_url: str,
-                  transaction_mcp_server_url: str,
-                  payment_mcp_server_url: str,
+                  account_mcp_pool: MCPPool,
+                  transaction_mcp_pool: MCPPool,
+                  payment_mcp_pool: MCPPool,
                   document_scanner_helper : DocumentIntelligenceInvoiceScanHelper):
         self.azure_chat_client = azure_chat_client
-        self.account_mcp_server_url = account_mcp_server_url
-        self.transaction_mcp_server_url = transaction_mcp_server_url
-        self.payment_mcp_server_url = payment_mcp_server_url
+        self.account_mcp_pool = account_mcp_pool
+        self.transaction_mcp_pool = transaction_mcp_pool
+        self.payment_mcp_pool = payment_mcp_pool
         self.document_scanner_helper = document_scanner_helper
+        self._af_agent: ChatAgent | None = None
+        self._af_agent_lock = asyncio.Lock()
+        self._mcp_sessions = MCPSessions(account_mcp_pool, transaction_mcp_pool, payment_mcp_pool)
         
 
 
     async def build_af_agent(self) -> ChatAgent:
+      """Return the Payment agent, building it on first use.
+      The current timestamp is provided on each run, so the agent is shared by all the conversations.
+      While an MCP server is unavailable the agent is built without its tools, and built again on the next call until it's back.
+      """
+      if self._af_agent is None or not self._mcp_sessions.complete:
+        async with self._af_agent_lock:
+          if self._af_agent is None or not self._mcp_sessions.complete:
+            self._af_agent = await self._create_af_agent()
+      return self._af_agent
+
+    async def _create_af_agent(self) -> ChatAgent:
     
-      logger.info("Building request scoped Payment agent run ")
+      logger.info("Building Payment agent ")
       
       user_mail="bob.user@contoso.com"
-      current_date_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-      full_instruction = PaymentAgent.instructions.format(user_mail=user_mail, current_date_time=current_date_time)
-
-      
-      
-      logger.info("Initializing Account MCP server tools ")
-      account_mcp_server = MCPStreamableHTTPTool(
-        name="Account MCP server client",
-        url=self.account_mcp_server_url
-     )
-      await account_mcp_server.connect()
-     
-      logger.info("Initializing Transaction MCP server tools ")
-      transaction_mcp_server = MCPStreamableHTTPTool(
-        name="Transaction MCP server client",
-        url=self.transaction_mcp_server_url
-     )
-      await transaction_mcp_server.connect()
-
-      logger.info("Initializing Payment  MCP server tools ")
-      payment_mcp_server = MCPStreamableHTTPTool(
-        name="Payment MCP server client",
-        url=self.payment_mcp_server_url
-     )
-      await payment_mcp_server.connect()
+      logger.info("Initializing Account, Transaction and Payment MCP server tools ")
+      mcp_servers = await self._mcp_sessions.acquire_missing()
+      full_instruction = PaymentAgent.instructions.format(user_mail=user_mail) + self._mcp_sessions.unavailable_instructions()
 
       return ChatAgent(
             chat_client=self.azure_chat_client,
             instructions=full_instruction,
             name=PaymentAgent.name,
-            tools=[account_mcp_server,
-                   transaction_mcp_server, 
-                   payment_mcp_server, 
-                   self.document_scanner_helper.scan_invoice]
-        )
\ No newline at end of file
+            tools=[*mcp_servers, self.document_scanner_helper.scan_invoice],
+            context_providers=CurrentTimestampProvider()
+        )
@@ -1,11 +1,15 @@
-from typing import Any, AsyncGenerator
-from agent_framework import ChatAgent
+from typing import Any, AsyncGenerator, Coroutine
+from cachetools import TTLCache
+from agent_framework import AIFunction, AgentThread, ChatAgent, ChatMessage, FunctionCallContent, Role, ai_function
 from agent_framework.exceptions import AgentThreadException
 from agent_framework.azure import AzureOpenAIChatClient
 from app.agents.azure_chat.account_agent import AccountAgent
 from app.agents.azure_chat.transaction_agent import TransactionHistoryAgent
 from app.agents.azure_chat.payment_agent import PaymentAgent
+from app.helpers.thread_state_store import ThreadStateStore
+from app.helpers.triage_cache import TriageCache
 from uuid import uuid4
+import asyncio
 import logging
 
 
@@ -30,24 +34,58 @@ class SupervisorAgent :
     name = "SupervisorAgent"
     description = "This agent triages customer requests and routes them to the appropriate agent."
 
-    """ A simple in-memory store [thread_id,serialized Thread state] to keep track of threads per user/session. 
+    """ A simple in-memory store [thread_id,Thread messages per turn] to keep track of threads per user/session. 
+    It's bounded in size and a thread is evicted when it's not updated for THREAD_STORE_TTL_SECONDS, so that abandoned conversations don't leak memory.
     In production, this should be replaced with a persistent store like a database or distributed cache.
     """
-    thread_store: dict[str, dict[str, Any]] = {}
+    THREAD_STORE_MAX_SIZE = 10_000
+    THREAD_STORE_TTL_SECONDS = 3600
+    thread_store = ThreadStateStore(maxsize=THREAD_STORE_MAX_SIZE, ttl=THREAD_STORE_TTL_SECONDS)
 
     """ like the thread_store but only with supervisor generated messages. it's used for improve accuracy of agent selection avoiding to innclude messages from sub-agents."""
-    supervisor_thread_store: dict[str, dict[str, Any]] = {}
+    supervisor_thread_store = ThreadStateStore(maxsize=THREAD_STORE_MAX_SIZE, ttl=THREAD_STORE_TTL_SECONDS)
+
+    """ Live AgentThread objects [thread_id, (thread, supervisor thread)] of the recently active conversations.
+    A hit resumes the conversation without replaying the thread stores, on a miss (evicted, or conversation served by another worker)
+    the threads are rebuilt from the thread stores. A request takes the threads out for its turn and puts them back once the turn is saved:
+    concurrent requests on a conversation don't share a message store, and after a failed turn the threads are rebuilt from the thread stores.
+    """
+    LIVE_THREADS_MAX_SIZE = 1_000
+    LIVE_THREADS_TTL_SECONDS = 600
+    live_threads: TTLCache[str, tuple[AgentThread, AgentThread]] = TTLCache(maxsize=LIVE_THREADS_MAX_SIZE, ttl=LIVE_THREADS_TTL_SECONDS)
+
+    """ Route tools built once per process from the route methods signature and docstring, instances bind them to their own methods.
+    It saves the input model generation of each route tool, otherwise done on every request as the supervisor agent is request scoped.
+    """
+    _route_tools: list[AIFunction] | None = None
 
     def __init__(self, 
                  azure_chat_client: AzureOpenAIChatClient,
                  account_agent: AccountAgent,
                  transaction_agent: TransactionHistoryAgent,
-                 payment_agent: PaymentAgent
+                 payment_agent: PaymentAgent,
+                 triage_cache: TriageCache | None = None
                                 ):
       self.azure_chat_client = azure_chat_client
       self.account_agent = account_agent
       self.transaction_agent = transaction_agent
       self.payment_agent = payment_agent
+      self.triage_cache = triage_cache
+      # route tools called during the current turn and embedding of the user message, used to feed the triage cache
+      self._routes_taken: list[str] = []
+      self._triage_embedding: Any = None
+      # strong references to the background sub-agents warm-up tasks, asyncio only keeps weak ones
+      self._warm_up_tasks: set[asyncio.Task] = set()
+      if SupervisorAgent._route_tools is None:
+        SupervisorAgent._route_tools = [ai_function(route) for route in (SupervisorAgent.route_to_account_agent,
+                                                                        SupervisorAgent.route_to_transaction_agent,
+                                                                        SupervisorAgent.route_to_payment_agent)]
+      self._tool_specs = [AIFunction(name=tool.name, description=tool.description, func=getattr(self, tool.name), input_model=tool.input_model)
+                          for tool in SupervisorAgent._route_tools]
+      # when streaming, (is sub-agent text, text) chunks forwarded to processMessageStream as they are generated
+      self._stream_queue: asyncio.Queue[tuple[bool, str] | None] | None = None
+      # when streaming, route calls requested by the supervisor during the current turn, counted before the routes are executed
+      self._route_calls = 0
      
         
 
@@ -57,32 +95,152 @@ class SupervisorAgent :
             chat_client=self.azure_chat_client,
             instructions=SupervisorAgent.instructions,
             name=SupervisorAgent.name,
-            tools=[self.route_to_account_agent,self.route_to_transaction_agent,self.route_to_payment_agent]
+            tools=self._tool_specs
         )
 
+    async def _resume_threads(self, agent: ChatAgent, thread_id: str) -> tuple[AgentThread, AgentThread]:
+      """Return the (thread, supervisor thread) of an existing conversation, taken from the live threads or rebuilt from the thread stores."""
+      live = SupervisorAgent.live_threads.pop(thread_id, None)
+      if live is not None:
+        return live
+      if thread_id not in SupervisorAgent.thread_store or thread_id not in SupervisorAgent.supervisor_thread_store:
+        raise AgentThreadException(f"Thread id {thread_id} not found in thread stores")
+      # there is bug in agent framework. The thread store replays the stored messages with update_from_thread_state as workaround
+      # self.current_thread = await agent.deserialize_thread(serialized_thread)
+      resumed_thread = agent.get_new_thread()
+      await SupervisorAgent.thread_store.load(thread_id, resumed_thread)
+      supervisor_resumed_thread = agent.get_new_thread()
+      await SupervisorAgent.supervisor_thread_store.load(thread_id, supervisor_resumed_thread)
+      return resumed_thread, supervisor_resumed_thread
+
+    async def _save_threads(self, thread_id: str, supervisor_thread: AgentThread) -> None:
+      """Append the messages of this turn to the thread stores and keep the threads live for the next turn."""
+      await SupervisorAgent.thread_store.save(thread_id, self.current_thread)
+      await SupervisorAgent.supervisor_thread_store.save(thread_id, supervisor_thread)
+      # only saved threads go back to the live threads, re-inserting refreshes the ttl
+      SupervisorAgent.live_threads[thread_id] = (self.current_thread, supervisor_thread)
+
+    def _warm_up_sub_agents(self) -> None:
+      """Start building the sub-agents in background, so that it overlaps with the supervisor LLM deciding the route.
+      The routes await the same lock guarded build, so they just wait for the warm-up still in progress.
+      """
+      for sub_agent in (self.account_agent, self.transaction_agent, self.payment_agent):
+        task = asyncio.create_task(sub_agent.build_af_agent())
+        self._warm_up_tasks.add(task)
+        task.add_done_callback(self._on_warm_up_done)
+
+    def _on_warm_up_done(self, task: asyncio.Task) -> None:
+      self._warm_up_tasks.discard(task)
+      # a failed warm-up is not fatal, the route will build the sub-agent again when called
+      if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Sub-agent warm-up failed: {str(task.exception())}")
+
+    async def _lookup_triage_cache(self, user_message: str) -> str | None:
+      """Return the route cached for a message similar to the user message, if any."""
+      self._triage_embedding = None
+      if self.triage_cache is None:
+        return None
+      try:
+        self._triage_embedding = await self.triage_cache.embed(user_message)
+      except Exception as e:
+        logger.warning(f"Unable to compute the user message embedding, triage cache skipped: {str(e)}")
+        return None
+      return self.triage_cache.lookup(self._triage_embedding)
+
+    def _store_triage_decision(self) -> None:
+      # only unambiguous decisions, where the supervisor routed the turn to a single agent, are cached
+      if self._triage_embedding is not None and len(self._routes_taken) == 1:
+        self.triage_cache.store(self._triage_embedding, self._routes_taken[0])
+
+    async def _run_cached_route(self, route: str, user_message: str, supervisor_thread: AgentThread) -> str:
+      """Call the cached route tool directly, skipping the supervisor LLM call."""
+      self._route_calls = 1
+      response_text = await getattr(self, route)(user_message)
+      # record the turn in the supervisor thread as if the supervisor had answered it
+      await supervisor_thread.on_new_messages([
+        ChatMessage(role=Role.USER, text=user_message),
+        ChatMessage(role=Role.ASSISTANT, text=response_text, author_name=SupervisorAgent.name)
+      ])
+      return response_text
+
+    async def _run_sub_agent(self, af_agent: ChatAgent) -> str:
+      """Run a sub-agent on the original user message.
+      When streaming and it's the only route of the turn, its answer is forwarded to the user as it's generated.
+      Otherwise the supervisor combines the answers of the routes, and its text is the one forwarded.
+      """
+      # parallel route calls are all counted before any of them runs, later ones once the live route is done
+      if self._stream_queue is None or self._route_calls != 1:
+        response = await af_agent.run(self.user_message, thread=self.current_thread)
+        return response.text
+      chunks: list[str] = []
+      async for update in af_agent.run_stream(self.user_message, thread=self.current_thread):
+        if update.text:
+          chunks.append(update.text)
+          self._stream_queue.put_nowait((True, update.text))
+      return "".join(chunks)
+
+    async def _stream_supervisor_run(self, agent: ChatAgent, user_message: str, supervisor_thread: AgentThread) -> None:
+      async for chunk in agent.run_stream(user_message, thread=supervisor_thread):
+        # the function calls of a response are streamed before the function invocation executes them
+        self._route_calls += sum(1 for content in chunk.contents if isinstance(content, FunctionCallContent) and content.call_id)
+        if chunk.text:
+          self._stream_queue.put_nowait((False, chunk.text))
+
+    async def _stream_turn(self, run: Coroutine[Any, Any, Any]) -> AsyncGenerator[str, None]:
+      """Execute the turn ``run`` yielding the text chunks it streams, sub-agent answers included.
+      Once a sub-agent answer has been streamed, the supervisor text is not forwarded as it only rephrases that answer,
+      unless other routes are called afterwards: the supervisor answer combining them follows the streamed one.
+      """
+      queue = self._stream_queue = asyncio.Queue()
+      self._route_calls = 0
+
+      async def execute() -> None:
+        try:
+          await run
+        finally:
+          queue.put_nowait(None)
+
+      task = asyncio.create_task(execute())
+      sub_agent_streamed = False
+      separator = "\n\n"
+      try:
+        while (item := await queue.get()) is not None:
+          is_sub_agent_text, text = item
+          if is_sub_agent_text or not sub_agent_streamed:
+            sub_agent_streamed = sub_agent_streamed or is_sub_agent_text
+            yield text
+          elif self._route_calls > 1:
+            yield separator + text
+            separator = ""
+        # raises the errors of the turn
+        await task
+      finally:
+        task.cancel()
+        self._stream_queue = None
+
     async def route_to_account_agent(self, user_message: str) -> str:
        """ Route the conversation to Account Agent"""
+       self._routes_taken.append("route_to_account_agent")
        af_account_agent = await self.account_agent.build_af_agent()
 
       #Please note we are using the original user message and not the one generated by the supervisor agent.
-       response = await af_account_agent.run(self.user_message, thread=self.current_thread)
-       return response.text
+       return await self._run_sub_agent(af_account_agent)
     
     async def route_to_transaction_agent(self, user_message: str) -> str:
        """ Route the conversation to Transaction History Agent"""
+       self._routes_taken.append("route_to_transaction_agent")
        af_transaction_agent = await self.transaction_agent.build_af_agent()
-      
+
       #Please note we are using the original user message and not the one generated by the supervisor agent.
-       response = await af_transaction_agent.run(self.user_message, thread=self.current_thread)
-       return response.text
+       return await self._run_sub_agent(af_transaction_agent)
     
     async def route_to_payment_agent(self, user_message: str) -> str:
        """ Route the conversation to Payment Agent"""
+       self._routes_taken.append("route_to_payment_agent")
        af_payment_agent = await self.payment_agent.build_af_agent()
-      
+
       #Please note we are using the original user message and not the one generated by the supervisor agent.
-       response = await af_payment_agent.run(self.user_message, thread=self.current_thread)
-       return response.text 
+       return await self._run_sub_agent(af_payment_agent) 
 
     async def processMessageStream(self, user_message: str , thread_id : str | None) -> AsyncGenerator[tuple[str, bool, str | None], None]:
       """Process a chat message and stream the response.
@@ -96,51 +254,47 @@ class SupervisorAgent :
       try:
           # Set up agent and thread (same as processMessage)
           agent = await self._build_af_agent()
+          self._warm_up_sub_agents()
 
           processed_thread_id = thread_id
-          supervisor_resumed_thread = agent.get_new_thread()
 
-          # Handle thread creation or resumption
+          # Handle thread creation or resumption. New threads are empty, they are stored at the end of the turn
           if processed_thread_id is None:
               self.current_thread = agent.get_new_thread()
+              supervisor_resumed_thread = agent.get_new_thread()
               processed_thread_id = str(uuid4())
-              SupervisorAgent.thread_store[processed_thread_id] = await self.current_thread.serialize()
-              SupervisorAgent.supervisor_thread_store[processed_thread_id] = await supervisor_resumed_thread.serialize()
           else:
-              serialized_thread = SupervisorAgent.thread_store.get(processed_thread_id, None)
-              supervisor_serialized_thread = SupervisorAgent.supervisor_thread_store.get(processed_thread_id, None)
-              
-              if serialized_thread is None or supervisor_serialized_thread is None:
-                  raise AgentThreadException(f"Thread id {processed_thread_id} not found in thread stores")
-              
-              resumed_thread = agent.get_new_thread()
-              await resumed_thread.update_from_thread_state(serialized_thread)
-              self.current_thread = resumed_thread
-              await supervisor_resumed_thread.update_from_thread_state(supervisor_serialized_thread)
+              self.current_thread, supervisor_resumed_thread = await self._resume_threads(agent, processed_thread_id)
 
           # Save the original user message
           self.user_message = user_message
+          self._routes_taken = []
 
-          # Stream the response
-          full_response = ""
+          # Follow-up messages depend on the conversation history, only the first message of a conversation is triaged from the cache
+          cached_route = await self._lookup_triage_cache(user_message) if thread_id is None else None
 
+          # Stream the response. Chunks, sub-agents ones included, are forwarded as they arrive, the full text is kept by the thread messages
           try:
-              # Use streaming
-              async for chunk in agent.run_stream(user_message, thread=supervisor_resumed_thread):
-                  if hasattr(chunk, 'text') and chunk.text:
-                      content = chunk.text
-                      full_response += content
-                      # Yield intermediate chunk
-                      yield (content, False, None)
+              if cached_route is not None:
+                  turn = self._run_cached_route(cached_route, user_message, supervisor_resumed_thread)
+              else:
+                  turn = self._stream_supervisor_run(agent, user_message, supervisor_resumed_thread)
+              async for text in self._stream_turn(turn):
+                  # Yield intermediate chunk
+                  yield (text, False, None)
+              if cached_route is None:
+                  self._store_triage_decision()
           except Exception as stream_error:
               logger.error(f"Error during streaming: {str(stream_error)}", exc_info=True)
               error_message = f"Streaming failed: {str(stream_error)}. Please try again or disable streaming."
+              if thread_id is None:
+                  # the thread id is returned to the client, so the new conversation must be resumable
+                  await self._save_threads(processed_thread_id, supervisor_resumed_thread)
               yield (error_message, True, processed_thread_id)
               return
 
-          # Update thread stores
-          SupervisorAgent.thread_store[processed_thread_id] = await self.current_thread.serialize()
-          SupervisorAgent.supervisor_thread_store[processed_thread_id] = await supervisor_resumed_thread.serialize()
+          # Update thread stores with the messages of this turn
+          await self._save_threads(processed_thread_id, supervisor_resumed_thread)
 
           # Yield final chunk with thread_id
           yield ("", True, processed_thread_id)
@@ -156,45 +310,38 @@ class SupervisorAgent :
       #For azure chat based agents we need to provide the message history externally as there is no built-in memory thread implementation per thread id.
       
       agent = await self._build_af_agent()
+      self._warm_up_sub_agents()
 
       processed_thread_id = thread_id
-      supervisor_resumed_thread =  agent.get_new_thread()
       # The AgentThread doesn't allow to provide an external id when using azure openai chat completion agent. so we need to manage the thread id externally.
+      # New threads are empty, they are stored at the end of the turn
       if processed_thread_id is None:
          self.current_thread = agent.get_new_thread()
+         supervisor_resumed_thread = agent.get_new_thread()
          processed_thread_id = str(uuid4())
-         SupervisorAgent.thread_store[processed_thread_id] = await  self.current_thread.serialize()
-         SupervisorAgent.supervisor_thread_store[processed_thread_id] = await supervisor_resumed_thread.serialize()
 
       else :
-        serialized_thread = SupervisorAgent.thread_store.get(processed_thread_id, None)
-        supervisor_serialized_thread = SupervisorAgent.supervisor_thread_store.get(processed_thread_id, None)
-        
-        if serialized_thread is None or supervisor_serialized_thread is None:
-           raise AgentThreadException(f"Thread id {processed_thread_id} not found in thread stores")
         # set the thread as class instance variable so that it can be shared by agents called in the tools
-        
-        # there is bug in agent framework. I'll use update_from_thread_state as workaround
-        # self.current_thread = await agent.deserialize_thread(serialized_thread)
-        resumed_thread =  agent.get_new_thread()
-        
-        await resumed_thread.update_from_thread_state(serialized_thread)
-        self.current_thread = resumed_thread
-
-        
-        await supervisor_resumed_thread.update_from_thread_state(supervisor_serialized_thread)
+        self.current_thread, supervisor_resumed_thread = await self._resume_threads(agent, processed_thread_id)
 
       #save the original user message to that can be used by sub-agents. we don't want to use the generated message from supervisor agent as input for sub-agents.
       # this is a hack when implementing supervisor pattern using agent-as-tool implementation. Once hand-off pattern will be available in agent framework it won't be required
       #as the context will be handed-off to the sub-agent who will take the control of the conversation and directly respond to the user.
       self.user_message = user_message
+      self._routes_taken = []
 
-      response = await agent.run(user_message, thread=supervisor_resumed_thread)
+      # Follow-up messages depend on the conversation history, only the first message of a conversation is triaged from the cache
+      cached_route = await self._lookup_triage_cache(user_message) if thread_id is None else None
+      if cached_route is not None:
+        response_text = await self._run_cached_route(cached_route, user_message, supervisor_resumed_thread)
+      else:
+        response = await agent.run(user_message, thread=supervisor_resumed_thread)
+        response_text = response.text
+        self._store_triage_decision()
 
-      #make sure to update the thread store with the latest thread state
-      SupervisorAgent.thread_store[processed_thread_id] = await self.current_thread.serialize()
-      SupervisorAgent.supervisor_thread_store[processed_thread_id] = await supervisor_resumed_thread.serialize()
+      #make sure to update the thread store with the messages of this turn
+      await self._save_threads(processed_thread_id, supervisor_resumed_thread)
       
-      return response.text, processed_thread_id
+      return response_text, processed_thread_id
 
     
\ No newline at end of file
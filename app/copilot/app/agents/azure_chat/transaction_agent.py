@@ -1,7 +1,9 @@
 from agent_framework.azure import AzureOpenAIChatClient
-from agent_framework import ChatAgent, MCPStreamableHTTPTool
-from datetime import datetime
+from agent_framework import ChatAgent
+from app.helpers.current_timestamp_provider import CurrentTimestampProvider
+from app.helpers.mcp_pool import MCPPool, MCPSessions
 
+import asyncio
 import logging
 
 
@@ -16,48 +18,47 @@ class TransactionHistoryAgent :
     Use html list or table to display the transaction information.
     Always use the below logged user details to retrieve account info:
     {user_mail}
-    Current timestamp:
-    {current_date_time}
     """
     name = "TransactionHistoryAgent"
     description = "This agent manages user transactions related information such as banking movements and payments history"
 
     def __init__(self, azure_chat_client: AzureOpenAIChatClient,
-                 account_mcp_server_url: str,
-                 transaction_mcp_server_url: str,
+                 account_mcp_pool: MCPPool,
+                 transaction_mcp_pool: MCPPool,
                   ):
         self.azure_chat_client = azure_chat_client
-        self.account_mcp_server_url = account_mcp_server_url
-        self.transaction_mcp_server_url = transaction_mcp_server_url
+        self.account_mcp_pool = account_mcp_pool
+        self.transaction_mcp_pool = transaction_mcp_pool
+        self._af_agent: ChatAgent | None = None
+        self._af_agent_lock = asyncio.Lock()
+        self._mcp_sessions = MCPSessions(account_mcp_pool, transaction_mcp_pool)
       
 
 
     async def build_af_agent(self) -> ChatAgent:
+      """Return the Transaction History agent, building it on first use.
+      The current timestamp is provided on each run, so the agent is shared by all the conversations.
+      While an MCP server is unavailable the agent is built without its tools, and built again on the next call until it's back.
+      """
+      if self._af_agent is None or not self._mcp_sessions.complete:
+        async with self._af_agent_lock:
+          if self._af_agent is None or not self._mcp_sessions.complete:
+            self._af_agent = await self._create_af_agent()
+      return self._af_agent
+
+    async def _create_af_agent(self) -> ChatAgent:
     
-      logger.info("Building request scoped transaction agent run ")
+      logger.info("Building transaction agent ")
       
       user_mail="bob.user@contoso.com"
-      current_date_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-      full_instruction = TransactionHistoryAgent.instructions.format(user_mail=user_mail, current_date_time=current_date_time)
-
-      logger.info("Initializing Account MCP server tools ")
-      #await self.account_mcp_server.__aenter__()
-      account_mcp_server = MCPStreamableHTTPTool(
-        name="Account MCP server client",
-        url=self.account_mcp_server_url
-     )
-      await account_mcp_server.connect()
-     
-      logger.info("Initializing Transaction MCP server tools ")
-      transaction_mcp_server = MCPStreamableHTTPTool(
-        name="Transaction MCP server client",
-        url=self.transaction_mcp_server_url
-     )
-      await transaction_mcp_server.connect()
+      logger.info("Initializing Account and Transaction MCP server tools ")
+      mcp_servers = await self._mcp_sessions.acquire_missing()
+      full_instruction = TransactionHistoryAgent.instructions.format(user_mail=user_mail) + self._mcp_sessions.unavailable_instructions()
 
       return ChatAgent(
             chat_client=self.azure_chat_client,
             instructions=full_instruction,
             name=TransactionHistoryAgent.name,
-            tools=[account_mcp_server, transaction_mcp_server],
-        )
\ No newline at end of file
+            tools=mcp_servers,
+            context_providers=CurrentTimestampProvider()
+        )
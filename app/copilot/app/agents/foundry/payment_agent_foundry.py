@@ -24,7 +24,8 @@ class PaymentAgent :
         Before submitting the payment to the system ask the user confirmation providing the payment details.
         Include in the payment description the invoice id or bill id as following: payment for invoice 1527248.
         When submitting payment always use the available functions to retrieve accountId, paymentMethodId.
-        If the payment succeeds provide the user with the payment confirmation. If not provide the user with the error message.
+        Payments are processed asynchronously: when the payment request is accepted tell the user the payment has been submitted, not that it succeeded.
+        Use the payment status function with the returned intent id to check the outcome. If the payment is completed provide the user with the payment confirmation. If it failed or the payment request is rejected provide the user with the error message.
         Use HTML list or table to display bill extracted data, payments, account or transaction details.
         Always use the below logged user details to retrieve account info:
        {user_mail}
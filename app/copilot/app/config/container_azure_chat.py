@@ -5,8 +5,12 @@ from dependency_injector import containers, providers
 from azure.ai.projects import AIProjectClient
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.storage.blob import BlobServiceClient
+from azure.identity import get_bearer_token_provider
+from openai import AsyncAzureOpenAI
 from app.helpers.blob_proxy import BlobStorageProxy
 from app.helpers.document_intelligence_scanner import DocumentIntelligenceInvoiceScanHelper
+from app.helpers.mcp_pool import MCPPool
+from app.helpers.triage_cache import TriageCache
 from app.config.azure_credential import get_azure_credential, get_azure_credential_async
 from app.config.settings import settings
 #Azure Chat based agent dependencies
@@ -60,36 +64,78 @@ class Container(containers.DeclarativeContainer):
         endpoint=settings.AZURE_OPENAI_ENDPOINT,deployment_name=settings.AZURE_OPENAI_CHAT_DEPLOYMENT_NAME
     )
 
+    # Warm MCP session pools shared by all the agents. Started and closed by the application lifespan
+    account_mcp_pool = providers.Singleton(
+        MCPPool,
+        name="Account MCP server client",
+        url=f"{settings.ACCOUNT_MCP_URL}/mcp"
+    )
+
+    transaction_mcp_pool = providers.Singleton(
+        MCPPool,
+        name="Transaction MCP server client",
+        url=f"{settings.TRANSACTION_MCP_URL}/mcp"
+    )
+
+    payment_mcp_pool = providers.Singleton(
+        MCPPool,
+        name="Payment MCP server client",
+        url=f"{settings.PAYMENT_MCP_URL}/mcp"
+    )
+
+    mcp_pools = providers.List(account_mcp_pool, transaction_mcp_pool, payment_mcp_pool)
+
     #Account Agent with Azure chat based agents. Can be singleton as thread state is passed to the underlying agent run method
     account_agent = providers.Singleton(
     AccountAgent,
     azure_chat_client=_azure_chat_client,
-    account_mcp_server_url=f"{settings.ACCOUNT_MCP_URL}/mcp"
+    account_mcp_pool=account_mcp_pool
     )
 
     transaction_agent = providers.Singleton(
     TransactionHistoryAgent,
     azure_chat_client=_azure_chat_client,
-    account_mcp_server_url=f"{settings.ACCOUNT_MCP_URL}/mcp",
-    transaction_mcp_server_url=f"{settings.TRANSACTION_MCP_URL}/mcp"
+    account_mcp_pool=account_mcp_pool,
+    transaction_mcp_pool=transaction_mcp_pool
     )
 
     payment_agent = providers.Singleton(
     PaymentAgent,
     azure_chat_client=_azure_chat_client,
-    account_mcp_server_url=f"{settings.ACCOUNT_MCP_URL}/mcp",
-    transaction_mcp_server_url=f"{settings.TRANSACTION_MCP_URL}/mcp",
-    payment_mcp_server_url=f"{settings.PAYMENT_MCP_URL}/mcp",
+    account_mcp_pool=account_mcp_pool,
+    transaction_mcp_pool=transaction_mcp_pool,
+    payment_mcp_pool=payment_mcp_pool,
     document_scanner_helper=document_intelligence_scanner
     )
 
+    # Dedicated client for the embedding deployment: the chat client one has the chat deployment in its base url
+    _azure_embeddings_client = providers.Singleton(
+        AsyncAzureOpenAI,
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        azure_deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME,
+        azure_ad_token_provider=providers.Factory(
+            get_bearer_token_provider,
+            providers.Factory(get_azure_credential),
+            "https://cognitiveservices.azure.com/.default"
+        ),
+        api_version="2024-10-21"
+    )
+
+    # Semantic cache of the supervisor routing decisions, enabled when an embedding deployment is configured
+    triage_cache = providers.Singleton(
+        TriageCache,
+        embeddings_client=_azure_embeddings_client,
+        deployment_name=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME
+    ) if settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME else providers.Object(None)
+
     #Supervisor Agent with Azure chat based agents. A per request instance is created as it holds the thread state
     supervisor_agent = providers.Factory(
         SupervisorAgent,
         azure_chat_client=_azure_chat_client,
         account_agent=account_agent,
         transaction_agent=transaction_agent,
-        payment_agent=payment_agent
+        payment_agent=payment_agent,
+        triage_cache=triage_cache
     )
 
 
@@ -50,8 +50,8 @@ class Container(containers.DeclarativeContainer):
         blob_storage_proxy=blob_proxy
     )
     
-
-     
+    # Foundry agents connect their own MCP servers, no warm session pool is used
+    mcp_pools = providers.List()
 
     
     #Azure Agent Service based agents
@@ -53,6 +53,8 @@ class Settings(BaseSettings):
     FOUNDRY_MODEL_DEPLOYMENT_NAME: str = Field(default="gpt-4o")
     AZURE_OPENAI_ENDPOINT: str | None = Field(default=None)
     AZURE_OPENAI_CHAT_DEPLOYMENT_NAME: str = Field(default="gpt-4o")
+    # Embedding deployment used to cache the supervisor routing decisions. The cache is disabled when not set
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME: str | None = Field(default=None)
 
     # Azure services
     AZURE_STORAGE_ACCOUNT: str | None = Field(default=None)
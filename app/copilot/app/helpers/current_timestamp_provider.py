@@ -0,0 +1,24 @@
+"""Context provider adding the current timestamp to the agent instructions.
+
+Lets agents be built once and reused across requests: the timestamp is
+appended to the static instructions on every run instead of being formatted
+into them when the agent is created.
+"""
+from datetime import datetime
+from typing import Any, MutableSequence
+from agent_framework import ChatMessage, Context, ContextProvider
+
+
+class CurrentTimestampProvider(ContextProvider):
+    """Provide the current timestamp as additional instructions on each agent run.
+
+    Usage:
+        agent = ChatAgent(..., context_providers=CurrentTimestampProvider())
+    """
+
+    PREFIX = "Current timestamp: "
+
+    async def invoking(self, messages: ChatMessage | MutableSequence[ChatMessage], **kwargs: Any) -> Context:
+        # same "%Y-%m-%d %H:%M:%S" layout as strftime, without parsing a format string on every run
+        current_date_time = datetime.now().isoformat(sep=" ", timespec="seconds")
+        return Context(instructions=CurrentTimestampProvider.PREFIX + current_date_time)
@@ -0,0 +1,277 @@
+"""Warm pool of MCP streamable HTTP sessions.
+
+Keeps already-initialized ``MCPStreamableHTTPTool`` instances for a single MCP
+server url, so agents can borrow a connected session instead of paying the
+transport, ``initialize`` and ``tools/list`` handshakes on every user message.
+A session is never reconnected in place: the agents built with it would see its
+tools list while it's reloaded. Unhealthy idle sessions are closed, and unhealthy
+borrowed ones are flagged so that their holder swaps them for a fresh session.
+
+Connections are retried once and guarded by a circuit breaker: after repeated
+failures the pool fails fast instead of letting every request wait for the
+connection timeout of an MCP server which is down.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Sequence
+from agent_framework import MCPStreamableHTTPTool
+from agent_framework.exceptions import ToolException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Sizing, health check and connection settings of an MCPPool.
+
+    Attributes:
+        min_sessions: Sessions opened at startup and kept warm by the health check
+        max_sessions: Upper bound of sessions concurrently borrowed from the pool
+        health_check_interval_s: Seconds between pings of the pooled sessions
+        connect_attempts: Connection attempts before a connection failure is raised
+        connect_backoff_s: Seconds before the first connection retry, doubled on each following retry
+        connect_max_backoff_s: Upper bound of the seconds between connection retries
+        breaker_failure_threshold: Consecutive connection failures which open the circuit breaker
+        breaker_recovery_timeout_s: Seconds the circuit breaker stays open before a connection is attempted again
+    """
+    min_sessions: int = 1
+    max_sessions: int = 4
+    health_check_interval_s: float = 30.0
+    connect_attempts: int = 2
+    connect_backoff_s: float = 0.1
+    connect_max_backoff_s: float = 1.0
+    breaker_failure_threshold: int = 5
+    breaker_recovery_timeout_s: float = 30.0
+
+
+class MCPPool:
+    """Pool of connected MCP sessions for a single MCP server url.
+
+    Sessions are held by long lived agents with ``acquire`` and given back with
+    ``release``. The health check pings every session, borrowed ones included: idle
+    ones failing the ping are closed, borrowed ones are only flagged and left to their
+    holder, which checks ``is_healthy`` and releases them to get a new session.
+
+    Usage:
+        pool = MCPPool(name="Account MCP server client", url="http://localhost:8070/mcp")
+        await pool.start()
+        account_mcp_server = await pool.acquire()
+        ...
+        await pool.release(account_mcp_server)
+        await pool.close()
+    """
+
+    def __init__(self, name: str, url: str, config: PoolConfig | None = None) -> None:
+        self.name = name
+        self.url = url
+        self.config = config or PoolConfig()
+        self._slots = asyncio.Semaphore(self.config.max_sessions)
+        self._idle: list[MCPStreamableHTTPTool] = []
+        # idle and borrowed sessions opened by this pool
+        self._owned: set[MCPStreamableHTTPTool] = set()
+        # borrowed sessions which failed the health check, closed when released
+        self._unhealthy: set[MCPStreamableHTTPTool] = set()
+        self._health_check_task: asyncio.Task | None = None
+        self._consecutive_failures = 0
+        self._circuit_opened_at: float | None = None
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit breaker is open: connections fail fast until the recovery timeout expires."""
+        return (self._circuit_opened_at is None
+                or time.monotonic() - self._circuit_opened_at >= self.config.breaker_recovery_timeout_s)
+
+    def is_healthy(self, tool: MCPStreamableHTTPTool) -> bool:
+        """False when a borrowed session lost its connection or failed the health check."""
+        return tool.is_connected and tool not in self._unhealthy
+
+    async def start(self) -> None:
+        """Open the minimum number of sessions and start the background health check.
+
+        Connection failures are logged and not raised: missing sessions are opened
+        lazily by ``acquire`` once the MCP server is reachable.
+        """
+        await self._fill_min_sessions()
+        if self._health_check_task is None:
+            self._health_check_task = asyncio.create_task(self._health_check_loop())
+
+    async def close(self) -> None:
+        """Stop the health check and disconnect all the pooled sessions."""
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        for tool in list(self._owned):
+            await self._discard(tool)
+        self._idle.clear()
+
+    async def acquire(self) -> MCPStreamableHTTPTool:
+        """Borrow a connected session, opening a new one when none is idle.
+
+        Waits when ``max_sessions`` sessions are already borrowed. Raises ``ToolException``
+        without waiting when no session is idle and the circuit breaker is open.
+        """
+        await self._slots.acquire()
+        try:
+            tool = self._idle.pop() if self._idle else await self._open_session()
+        except BaseException:
+            self._slots.release()
+            raise
+        return tool
+
+    async def release(self, tool: MCPStreamableHTTPTool) -> None:
+        """Return a session borrowed with ``acquire`` to the pool, closing it when it's not healthy."""
+        if tool not in self._owned:
+            raise ValueError(f"Session {tool} is not owned by pool {self.name}")
+        try:
+            if self.is_healthy(tool):
+                self._idle.append(tool)
+            else:
+                await self._discard(tool)
+        finally:
+            self._slots.release()
+
+    async def _open_session(self) -> MCPStreamableHTTPTool:
+        if not self.available:
+            raise ToolException(f"MCP server {self.name} at {self.url} is unavailable, circuit breaker is open")
+        logger.info("Opening new session for %s at %s", self.name, self.url)
+        for attempt in range(1, self.config.connect_attempts + 1):
+            # every attempt gets a new tool instance, so a failed one can't leave loaded tools behind
+            tool = MCPStreamableHTTPTool(name=self.name, url=self.url)
+            try:
+                await self._connect_once(tool)
+            except Exception:
+                self._record_failure()
+                if attempt == self.config.connect_attempts or not self.available:
+                    raise
+                await asyncio.sleep(min(self.config.connect_backoff_s * 2 ** (attempt - 1), self.config.connect_max_backoff_s))
+            else:
+                self._consecutive_failures = 0
+                self._circuit_opened_at = None
+                self._owned.add(tool)
+                return tool
+
+    def _record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.config.breaker_failure_threshold:
+            # also re-opened by a failed attempt after the recovery timeout
+            if self.available:
+                logger.warning("Opening circuit breaker for %s at %s after %d consecutive connection failures",
+                               self.name, self.url, self._consecutive_failures)
+            self._circuit_opened_at = time.monotonic()
+
+    async def _connect_once(self, tool: MCPStreamableHTTPTool) -> None:
+        # Connect from a dedicated task so the session transport is not bound to the
+        # cancel scope of the request which happened to open it.
+        try:
+            await asyncio.create_task(tool.connect())
+        except asyncio.CancelledError:
+            await self._close(tool)
+            if asyncio.current_task().cancelling():
+                raise
+            # the MCP transport reports connection failures by cancelling its own scope
+            raise ToolException(f"Failed to connect to the MCP server {self.name} at {self.url}") from None
+        except Exception:
+            await self._close(tool)
+            raise
+
+    async def _close(self, tool: MCPStreamableHTTPTool) -> None:
+        try:
+            await tool.close()
+        except Exception as ex:
+            # closing from a task other than the connecting one can fail, the session is dropped anyway
+            logger.debug("Error while closing session for %s: %s", self.name, ex)
+
+    async def _discard(self, tool: MCPStreamableHTTPTool) -> None:
+        self._owned.discard(tool)
+        self._unhealthy.discard(tool)
+        await self._close(tool)
+
+    async def _fill_min_sessions(self) -> None:
+        missing = self.config.min_sessions - len(self._owned - self._unhealthy)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self._open_session() for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning("Unable to open session for %s at %s: %s", self.name, self.url, result)
+            else:
+                self._idle.append(result)
+
+    async def _health_check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.health_check_interval_s)
+            for tool in list(self._owned - self._unhealthy):
+                try:
+                    await tool.session.send_ping()
+                    continue
+                except Exception as ex:
+                    logger.warning("Unhealthy session for %s: %s", self.name, ex)
+                if tool in self._idle:
+                    self._idle.remove(tool)
+                    await self._discard(tool)
+                elif tool in self._owned:
+                    # borrowed: agents may be running with it, its holder replaces it on the next build
+                    self._unhealthy.add(tool)
+            await self._fill_min_sessions()
+
+
+class MCPSessions:
+    """Sessions held by a long lived agent, one for each of its MCP servers.
+
+    Sessions of unavailable MCP servers are left out, so the agent can still be built
+    with the tools of the other servers, and acquired again by ``acquire_missing``.
+
+    Usage:
+        sessions = MCPSessions(account_mcp_pool, transaction_mcp_pool)
+        mcp_servers = await sessions.acquire_missing()
+        if not sessions.complete:
+            ...
+    """
+
+    def __init__(self, *pools: MCPPool) -> None:
+        self.pools = pools
+        self._sessions: dict[MCPPool, MCPStreamableHTTPTool] = {}
+
+    @property
+    def complete(self) -> bool:
+        """True when a healthy session is held for every pool."""
+        return all(pool in self._sessions and pool.is_healthy(self._sessions[pool]) for pool in self.pools)
+
+    @property
+    def unavailable(self) -> Sequence[MCPPool]:
+        """Pools without a connected session."""
+        return [pool for pool in self.pools if pool not in self._sessions]
+
+    def unavailable_instructions(self) -> str:
+        """Agent instructions telling the LLM which capabilities are currently unavailable, empty when none."""
+        if not self.unavailable:
+            return ""
+        names = ", ".join(pool.name for pool in self.unavailable)
+        return (f"\nThe following services are temporarily unavailable: {names}. If the user request needs them, "
+                "tell the user that this capability is temporarily unavailable and to try again later.")
+
+    async def acquire_missing(self) -> list[MCPStreamableHTTPTool]:
+        """Borrow concurrently the sessions not held yet and return all the held ones.
+
+        Sessions which lost their connection or failed the health check are given back
+        to their pool and replaced. Pools failing to provide a session are logged and left
+        out until the next call.
+        """
+        for pool, tool in list(self._sessions.items()):
+            if not pool.is_healthy(tool):
+                del self._sessions[pool]
+                await pool.release(tool)
+        missing = self.unavailable
+        results = await asyncio.gather(*(pool.acquire() for pool in missing), return_exceptions=True)
+        for pool, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.warning("MCP server %s unavailable, its tools are left out: %s", pool.name, result)
+            elif not isinstance(result, BaseException):
+                self._sessions[pool] = result
+        # cancellation is raised once the sessions already borrowed are kept, so they are not leaked
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return [self._sessions[pool] for pool in self.pools if pool in self._sessions]
@@ -0,0 +1,73 @@
+"""In-memory store of agent thread states.
+
+Chat history only grows, so each save appends the messages added since the
+previous save as a new turn instead of storing the whole serialized history
+again. The thread state is rebuilt by replaying the turns when resumed.
+
+Turns are kept as zstd compressed JSON: chat messages and tool results are
+text heavy and shrink several times, so many more threads fit in a worker.
+"""
+from typing import Any
+import orjson
+import zstandard
+from cachetools import TTLCache
+from agent_framework import AgentThread, ChatMessage
+
+# shared across the process, the compression contexts are reused by every save and load
+_compressor = zstandard.ZstdCompressor(level=3, threads=-1)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+class ThreadStateStore:
+    """Bounded store [thread_id, (message count, compressed message turns)] of agent threads with local message history.
+
+    A thread is evicted when it's not saved for ``ttl`` seconds or when the store
+    exceeds ``maxsize`` threads, so abandoned conversations don't leak memory.
+
+    Usage:
+        store = ThreadStateStore(maxsize=10_000, ttl=3600)
+        await store.save(thread_id, thread)
+        found = await store.load(thread_id, agent.get_new_thread())
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._turns: TTLCache[str, tuple[int, list[bytes]]] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._turns
+
+    async def save(self, thread_id: str, thread: AgentThread) -> None:
+        """Append the thread messages not stored yet as the next turn of ``thread_id``."""
+        messages = await thread.message_store.list_messages() if thread.message_store is not None else []
+        stored_count, turns = self._turns.get(thread_id, (0, []))
+        if len(messages) < stored_count:
+            # the message store has been truncated, the stored turns can't be replayed anymore
+            turns = [_compress(messages)]
+        elif len(messages) > stored_count or not turns:
+            turns.append(_compress(messages[stored_count:]))
+        # re-inserting refreshes the ttl of the thread
+        self._turns[thread_id] = (len(messages), turns)
+
+    async def load(self, thread_id: str, thread: AgentThread) -> bool:
+        """Replay the stored turns of ``thread_id`` into ``thread``.
+
+        Returns:
+            False when the thread id is not found in the store
+        """
+        stored = self._turns.get(thread_id)
+        if stored is None:
+            return False
+        _, turns = stored
+        thread_state: dict[str, Any] = {
+            "chat_message_store_state": {"messages": [message for turn in turns for message in _decompress(turn)]}
+        }
+        await thread.update_from_thread_state(thread_state)
+        return True
+
+
+def _compress(messages: list[ChatMessage]) -> bytes:
+    return _compressor.compress(orjson.dumps([message.to_dict() for message in messages]))
+
+
+def _decompress(turn: bytes) -> list[ChatMessage]:
+    return [ChatMessage.from_dict(message) for message in orjson.loads(_decompressor.decompress(turn))]
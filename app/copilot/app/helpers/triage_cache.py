@@ -0,0 +1,91 @@
+"""Semantic cache of the supervisor routing decisions.
+
+Stores the embedding of user messages together with the route chosen by the
+supervisor agent, so that near duplicate messages ("show my balance", "check my
+balance") can be routed without the supervisor LLM call.
+"""
+import logging
+import time
+import numpy as np
+from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class TriageCache:
+    """In-memory nearest neighbour cache [message embedding, route].
+
+    Usage:
+        cache = TriageCache(embeddings_client=client, deployment_name="text-embedding-3-small")
+        embedding = await cache.embed("show my balance")
+        route = cache.lookup(embedding)
+        if route is None:
+            ...
+            cache.store(embedding, "route_to_account_agent")
+    """
+
+    def __init__(
+        self,
+        embeddings_client: AsyncAzureOpenAI,
+        deployment_name: str,
+        similarity_threshold: float = 0.92,
+        ttl_s: float = 3600.0,
+        max_entries: int = 1000
+    ) -> None:
+        """Initialize the triage cache.
+
+        Args:
+            embeddings_client: Azure OpenAI client used to compute message embeddings
+            deployment_name: Embedding model deployment name
+            similarity_threshold: Minimum cosine similarity for a cached route to be reused
+            ttl_s: Seconds a routing decision is reused before expiring
+            max_entries: Maximum number of cached decisions, the oldest ones are evicted first
+        """
+        self._embeddings_client = embeddings_client
+        self._deployment_name = deployment_name
+        self._similarity_threshold = similarity_threshold
+        self._ttl_s = ttl_s
+        self._max_entries = max_entries
+        # rows are unit vectors, so a matrix product gives the cosine similarities
+        self._embeddings: np.ndarray | None = None
+        self._routes: list[str] = []
+        self._stored_at: list[float] = []
+
+    async def embed(self, message: str) -> np.ndarray:
+        """Compute the normalized embedding of a user message."""
+        response = await self._embeddings_client.embeddings.create(model=self._deployment_name, input=message)
+        embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def lookup(self, embedding: np.ndarray) -> str | None:
+        """Return the route of the most similar cached message, if similar enough and not expired."""
+        self._evict_expired()
+        if self._embeddings is None or not self._routes:
+            return None
+        similarities = self._embeddings @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self._similarity_threshold:
+            return None
+        logger.info("Triage cache hit with similarity %.3f for route %s", similarities[best], self._routes[best])
+        return self._routes[best]
+
+    def store(self, embedding: np.ndarray, route: str) -> None:
+        """Record the route chosen by the supervisor for a message embedding."""
+        self._evict_expired()
+        if self._embeddings is None or not self._routes:
+            self._embeddings = embedding[np.newaxis, :]
+        else:
+            self._embeddings = np.vstack([self._embeddings, embedding])[-self._max_entries:]
+        self._routes = (self._routes + [route])[-self._max_entries:]
+        self._stored_at = (self._stored_at + [time.monotonic()])[-self._max_entries:]
+
+    def _evict_expired(self) -> None:
+        # entries are appended in time order, so the expired ones are at the beginning
+        expired = 0
+        deadline = time.monotonic() - self._ttl_s
+        while expired < len(self._stored_at) and self._stored_at[expired] < deadline:
+            expired += 1
+        if expired:
+            self._embeddings = self._embeddings[expired:]
+            self._routes = self._routes[expired:]
+            self._stored_at = self._stored_at[expired:]
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from app.api import auth_routers, chat_routers, content_routers
 from app.config.settings import settings
@@ -38,8 +39,12 @@ def create_app() -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
+        # Warm up the MCP session pools so that the first chat requests don't pay the connection handshakes
+        mcp_pools = container.mcp_pools()
+        await asyncio.gather(*(pool.start() for pool in mcp_pools))
         yield
         logger.info("Shutting down application...")
+        await asyncio.gather(*(pool.close() for pool in mcp_pools))
         container.unwire()
 
     app.router.lifespan_context = lifespan